@@ -4,24 +4,195 @@ repovis - Unified tool for preprocessing and serving git repository visualizatio
 """
 
 import argparse
+import gzip
 import hashlib
+import importlib.util
+import json
+import mimetypes
+import os
+import queue
+import re
 import sqlite3
+import stat
+import subprocess
 import sys
+import time
 from pathlib import Path
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
 
 from git import Repo
 from tqdm import tqdm
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+import anyio
+import orjson
 import uvicorn
 
 
+# Bump when the database layout changes so stale caches get rebuilt
+SCHEMA_VERSION = 4
+
+# Number of commits handed to a worker process per git log invocation
+COMMIT_CHUNK_SIZE = 256
+
+# Number of buffered commit rows written per executemany flush
+FLUSH_ROWS = 20000
+
+# Number of distinct (file, contributor, date) keys aggregated in memory before flushing
+METRICS_FLUSH_ENTRIES = 50000
+
+# Commits loaded between intermediate COMMITs, bounding WAL growth during preprocessing
+TRANSACTION_COMMITS = 50000
+
+# Stored commit messages are truncated to this many characters
+MESSAGE_MAX_LENGTH = 500
+
+# Maximum bound parameters used in a single "IN (...)" lookup
+SQL_IN_CHUNK = 500
+
+# Per-file columns of the /api/tree response, in output order
+FILE_COLUMNS = ('id', 'path', 'parent_id', 'name', 'is_directory')
+
+# Distinct /api/tree parameter sets whose serialized responses are kept in memory
+TREE_CACHE_SIZE = 256
+
+# RETURNING lets get-or-create run as a single statement (SQLite >= 3.35)
+SQLITE_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Repository path for commit extraction workers (set by _init_worker)
+_worker_repo_path = None
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson straight to bytes"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip; an explicit gzip entry overrides '*'"""
+    qualities = {}
+    for token in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in token.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves a file's .gz sibling when the client accepts gzip"""
+
+    async def get_response(self, path, scope):
+        request_headers = Headers(scope=scope)
+        if (scope["method"] not in ("GET", "HEAD") or path.endswith(".gz")
+                or not _accepts_gzip(request_headers.get("accept-encoding", ""))):
+            return await super().get_response(path, scope)
+        try:
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, f"{path}.gz")
+            _, source_stat = await anyio.to_thread.run_sync(self.lookup_path, path)
+        except (OSError, ValueError):
+            stat_result = source_stat = None
+        # A source edited while serving outdates its .gz until the next startup
+        if not (stat_result and stat.S_ISREG(stat_result.st_mode)
+                and source_stat and stat_result.st_mtime >= source_stat.st_mtime):
+            return await super().get_response(path, scope)
+        # Validate against the .gz file's own ETag, which is the one this client was sent
+        response = FileResponse(full_path, stat_result=stat_result,
+                                media_type=mimetypes.guess_type(path)[0] or "text/plain",
+                                headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def precompress_static(directory: Path):
+    """Write a .gz copy next to each static file that lacks an up-to-date one"""
+    for path in directory.rglob("*"):
+        if not path.is_file() or path.suffix == ".gz":
+            continue
+        gz_path = path.with_name(path.name + ".gz")
+        if gz_path.exists() and gz_path.stat().st_mtime >= path.stat().st_mtime:
+            continue
+        try:
+            gz_path.write_bytes(gzip.compress(path.read_bytes(), compresslevel=9, mtime=0))
+        except OSError:
+            return  # Read-only install: GZipMiddleware compresses on the fly instead
+
+
+def _init_worker(repo_path: str):
+    """Initialize a commit extraction worker process"""
+    global _worker_repo_path
+    _worker_repo_path = repo_path
+
+
+def _extract_commits(shas):
+    """Run git log over a chunk of commit SHAs and return parsed commit records.
+
+    Each record is (sha, author_name, author_email, timestamp, message, file_changes)
+    where file_changes is a list of (file_path, lines_added, lines_deleted) taken
+    straight from git's --numstat counts. Runs in a worker process, so it must
+    not touch the database.
+    """
+    git_cmd = ['git', 'log', '--no-walk=unsorted', '--stdin', '--no-renames', '-z',
+               '--pretty=format:%H%x00%an%x00%ae%x00%at%x00%s%x00', '--numstat']
+    proc = subprocess.Popen(git_cmd, cwd=_worker_repo_path, stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=1 << 20)
+    stdout, stderr = proc.communicate('\n'.join(shas).encode())
+    if proc.returncode != 0:
+        raise RuntimeError(stderr.decode('utf-8', errors='replace'))
+    
+    # With -z every field is NUL-terminated: five header fields, then one
+    # "added\tdeleted\tpath" field per file (the first preceded by a newline),
+    # then an empty field separating commits. Paths come through unquoted.
+    fields = stdout.split(b'\x00')
+    field_count = len(fields)
+    commits = []
+    i = 0
+    
+    while i + 4 < field_count:
+        sha, author_name, author_email, timestamp = (
+            field.decode('utf-8', errors='replace') for field in fields[i:i + 4]
+        )
+        # Cap here so over-long subjects are not shipped back to the main process
+        message = fields[i + 4].decode('utf-8', errors='replace')[:MESSAGE_MAX_LENGTH]
+        i += 5
+        
+        # Numstat fields ("-" counts for binary files) up to the separator
+        file_changes = []
+        while i < field_count and fields[i]:
+            added, deleted, file_path = fields[i].lstrip(b'\n').split(b'\t', 2)
+            file_changes.append((
+                file_path.decode('utf-8', errors='replace'),
+                int(added) if added != b'-' else 0,
+                int(deleted) if deleted != b'-' else 0
+            ))
+            i += 1
+        i += 1
+        
+        commits.append((sha, author_name, author_email, timestamp, message, file_changes))
+    
+    return commits
+
+
 class RepoVis:
-    def __init__(self, repo_path: str, since: str = None, until: str = None):
+    def __init__(self, repo_path: str, since: str = None, until: str = None, jobs: int = None):
         self.repo_path = Path(repo_path).resolve()
         self.repo = None
         self.db_path = None
@@ -29,15 +200,18 @@ class RepoVis:
         self.cursor = None
         self.since = since
         self.until = until
+        self.jobs = jobs or os.cpu_count() or 1
         
         # In-memory caches for lookups
         self.file_cache = {}
         self.contributor_cache = {}
+        self.ancestors_cache = {}  # {dir_path: (dir_path, parent_dir, ..., top_dir)}
+        self.date_cache = {}  # {days_since_epoch: 'YYYY-MM-DD'}
         
     def get_cache_db_path(self) -> Path:
         """Generate cache DB path: .repovis/reponame_gitdirhash[_dates].db"""
         repo_name = self.repo_path.name
-        git_dir_hash = hashlib.sha256(str(self.repo_path).encode()).hexdigest()[:16]
+        git_dir_hash = hashlib.blake2b(str(self.repo_path).encode(), digest_size=8).hexdigest()
         
         cache_dir = self.repo_path / ".repovis"
         cache_dir.mkdir(exist_ok=True)
@@ -71,74 +245,78 @@ class RepoVis:
         self.conn = sqlite3.connect(self.db_path)
         self.cursor = self.conn.cursor()
         
-        # Load schema
-        schema_path = Path(__file__).parent / "schema.sql"
+        # Bulk-load tuning: the cache DB is simply rebuilt if preprocessing is
+        # interrupted, so durability guarantees are traded for write speed
+        self.cursor.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=OFF;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-262144;
+            PRAGMA mmap_size=268435456;
+            PRAGMA locking_mode=EXCLUSIVE;
+        """)
+        
+        # Load tables only; the UNIQUE constraints needed for conflict
+        # resolution come with them, secondary indexes wait for finalize_indexes
+        schema_path = Path(__file__).parent / "schema_tables.sql"
         with open(schema_path) as f:
             self.cursor.executescript(f.read())
         
+        # Raw metric rows go to an unindexed staging table during the load and
+        # are aggregated into file_metrics once at the end of process_commits
+        self.cursor.execute("""
+            CREATE TEMP TABLE file_metrics_stage (
+                file_id INTEGER,
+                contributor_id INTEGER,
+                date TEXT,
+                commit_count INTEGER,
+                lines_added INTEGER,
+                lines_deleted INTEGER
+            )
+        """)
+        
         self.conn.commit()
     
+    def finalize_indexes(self):
+        """Build secondary indexes once all rows are loaded"""
+        print("Building indexes...")
+        schema_path = Path(__file__).parent / "schema_indexes.sql"
+        with open(schema_path) as f:
+            self.cursor.executescript(f"BEGIN;\n{f.read()}\nANALYZE;\nCOMMIT;")
+    
     def get_or_create_contributor(self, name: str, email: str) -> int:
         """Get or create contributor, return ID"""
         if email in self.contributor_cache:
             return self.contributor_cache[email]
         
-        self.cursor.execute(
-            "INSERT OR IGNORE INTO contributors (name, email) VALUES (?, ?)",
-            (name, email)
-        )
-        self.cursor.execute("SELECT id FROM contributors WHERE email = ?", (email,))
+        if SQLITE_HAS_RETURNING:
+            # The no-op update makes RETURNING yield the existing row's id too
+            self.cursor.execute(
+                "INSERT INTO contributors (name, email) VALUES (?, ?) "
+                "ON CONFLICT(email) DO UPDATE SET email = excluded.email RETURNING id",
+                (name, email)
+            )
+        else:
+            self.cursor.execute(
+                "INSERT OR IGNORE INTO contributors (name, email) VALUES (?, ?)",
+                (name, email)
+            )
+            self.cursor.execute("SELECT id FROM contributors WHERE email = ?", (email,))
         contributor_id = self.cursor.fetchone()[0]
         self.contributor_cache[email] = contributor_id
         return contributor_id
     
-    def get_or_create_file(self, path: str) -> int:
-        """Get or create file entry, return ID. Creates parent directories as needed."""
-        if path in self.file_cache:
-            return self.file_cache[path]
-        
-        is_directory = path.endswith('/')
-        clean_path = path.rstrip('/')
-        
-        parent_id = None
-        if '/' in clean_path:
-            parent_path = '/'.join(clean_path.split('/')[:-1])
-            if parent_path:
-                parent_id = self.get_or_create_file(parent_path + '/')
-        
-        name = clean_path.split('/')[-1] if '/' in clean_path else clean_path
-        
-        self.cursor.execute(
-            "INSERT OR IGNORE INTO files (path, parent_id, name, is_directory) VALUES (?, ?, ?, ?)",
-            (path, parent_id, name, is_directory)
-        )
-        self.cursor.execute("SELECT id FROM files WHERE path = ?", (path,))
-        file_id = self.cursor.fetchone()[0]
-        self.file_cache[path] = file_id
-        return file_id
-    
-    def update_metrics(self, file_id: int, contributor_id: int, date: str, 
-                       commit_count: int = 1):
-        """Update or insert file metrics"""
-        self.cursor.execute("""
-            INSERT INTO file_metrics (file_id, contributor_id, date, commit_count, lines_added, lines_deleted)
-            VALUES (?, ?, ?, ?, 0, 0)
-            ON CONFLICT(file_id, contributor_id, date) 
-            DO UPDATE SET 
-                commit_count = commit_count + ?
-        """, (file_id, contributor_id, date, commit_count, commit_count))
-    
     def process_commits(self):
         """Process commits in the repository (optionally filtered by date range)"""
         print("Processing commits...")
         
-        # Build git log command for single-pass processing
-        git_cmd = ['git', 'log', '--all', '--pretty=format:%H%x00%an%x00%ae%x00%at%x00%s', '--name-only', '--no-merges']
+        # Stream commit SHAs from rev-list and hand them to workers in chunks
+        rev_args = ['--all', '--no-merges']
         
         if self.since:
-            git_cmd.append(f'--since={self.since}')
+            rev_args.append(f'--since={self.since}')
         if self.until:
-            git_cmd.append(f'--until={self.until}')
+            rev_args.append(f'--until={self.until}')
         
         if self.since or self.until:
             date_info = f" (from {self.since or 'beginning'} to {self.until or 'now'})"
@@ -147,78 +325,123 @@ class RepoVis:
         
         print(f"Running git log{date_info}...")
         
-        import subprocess
-        result = subprocess.run(git_cmd, cwd=self.repo_path, capture_output=True, text=True)
+        # Counting is cheap compared to listing, and only feeds the progress bar
+        result = subprocess.run(['git', 'rev-list', '--count'] + rev_args,
+                                cwd=self.repo_path, capture_output=True, text=True)
         if result.returncode != 0:
-            print(f"Error running git log: {result.stderr}", file=sys.stderr)
+            print(f"Error running git rev-list: {result.stderr}", file=sys.stderr)
             sys.exit(1)
+        total_commits = int(result.stdout.strip() or 0)
         
-        # Parse output
-        lines = result.stdout.strip().split('\n')
+        rev_proc = subprocess.Popen(['git', 'rev-list'] + rev_args, cwd=self.repo_path,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        chunks = self._iter_sha_chunks(rev_proc.stdout)
         
         processed = 0
+        committed = 0
         commit_batch = []
         file_batch = set()
-        metrics_accumulator = defaultdict(int)  # {(file_path, contributor_id, date): count}
-        
-        i = 0
-        total_lines = len(lines)
+        metrics_accumulator = defaultdict(lambda: [0, 0, 0])  # {(file_path, contributor_id, date): [commits, added, deleted]}
         
-        with tqdm(total=total_lines, desc="Processing commits", unit=" lines") as pbar:
-            while i < total_lines:
-                if not lines[i]:
-                    i += 1
-                    pbar.update(1)
-                    continue
-                
-                # Parse commit header: SHA\0name\0email\0timestamp\0message
-                parts = lines[i].split('\x00')
-                if len(parts) < 5:
-                    i += 1
-                    pbar.update(1)
-                    continue
-                
-                sha, author_name, author_email, timestamp, message = parts[0], parts[1], parts[2], parts[3], '\x00'.join(parts[4:])
-                contributor_id = self.get_or_create_contributor(author_name, author_email)
-                
-                commit_date = datetime.fromtimestamp(int(timestamp))
-                date_str = commit_date.strftime('%Y-%m-%d')
-                
-                commit_batch.append((sha, contributor_id, date_str, message[:500]))
-                
-                # Get file list (lines after commit header until blank line or next commit)
-                i += 1
-                pbar.update(1)
-                
-                while i < total_lines and lines[i] and not '\x00' in lines[i]:
-                    file_path = lines[i].strip()
-                    if file_path:
-                        if file_path not in self.file_cache:
-                            file_batch.add(file_path)
+        try:
+            with tqdm(total=total_commits, desc="Processing commits", unit=" commits") as pbar:
+                for commits in self._extract_all(chunks, total_commits):
+                    for sha, author_name, author_email, timestamp, message, file_changes in commits:
+                        contributor_id = self.get_or_create_contributor(author_name, author_email)
+                        
+                        date_str = self.format_day(int(timestamp) // 86400)
                         
-                        key = (file_path, contributor_id, date_str)
-                        metrics_accumulator[key] += 1
+                        commit_batch.append((sha, contributor_id, date_str, message))
+                        
+                        for file_path, lines_added, lines_deleted in file_changes:
+                            if file_path not in self.file_cache:
+                                file_batch.add(file_path)
+                            
+                            metrics = metrics_accumulator[(file_path, contributor_id, date_str)]
+                            metrics[0] += 1
+                            metrics[1] += lines_added
+                            metrics[2] += lines_deleted
+                        
+                        processed += 1
+                        
+                        if len(commit_batch) >= FLUSH_ROWS or len(metrics_accumulator) >= METRICS_FLUSH_ENTRIES:
+                            self._batch_commit_data(commit_batch, file_batch, metrics_accumulator)
+                            commit_batch = []
+                            file_batch = set()
+                            metrics_accumulator.clear()
+                            
+                            if processed - committed >= TRANSACTION_COMMITS:
+                                self.conn.commit()
+                                self.cursor.execute("BEGIN")
+                                committed = processed
                     
-                    i += 1
-                    pbar.update(1)
-                
-                processed += 1
-                
-                # Batch commit every 1000 commits
-                if processed % 1000 == 0:
-                    self._batch_commit_data(commit_batch, file_batch, metrics_accumulator)
-                    commit_batch = []
-                    file_batch = set()
-                    metrics_accumulator.clear()
+                    # One progress update per extracted chunk rather than per commit
+                    pbar.update(len(commits))
+        except RuntimeError as e:
+            rev_proc.kill()
+            print(f"Error running git log: {e}", file=sys.stderr)
+            sys.exit(1)
+        
+        if rev_proc.wait() != 0:
+            print(f"Error running git rev-list: {rev_proc.stderr.read()}", file=sys.stderr)
+            sys.exit(1)
         
         # Final batch
         if commit_batch:
             self._batch_commit_data(commit_batch, file_batch, metrics_accumulator)
         
+        self._merge_staged_metrics()
+        
         print(f"\nProcessed {processed} commits")
     
+    def format_day(self, day: int) -> str:
+        """Format a UTC day number (days since epoch) as YYYY-MM-DD, cached per day"""
+        date_str = self.date_cache.get(day)
+        if date_str is None:
+            date_str = time.strftime('%Y-%m-%d', time.gmtime(day * 86400))
+            self.date_cache[day] = date_str
+        return date_str
+    
+    @staticmethod
+    def _iter_sha_chunks(lines):
+        """Group a stream of SHA lines into lists of COMMIT_CHUNK_SIZE"""
+        chunk = []
+        for line in lines:
+            sha = line.strip()
+            if not sha:
+                continue
+            chunk.append(sha)
+            if len(chunk) >= COMMIT_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def _extract_all(self, chunks, total_commits):
+        """Yield parsed commit chunks in order, extracting them in parallel worker processes.
+        
+        Only extraction is parallel; the caller performs all database writes.
+        Chunks are pulled from the iterator lazily, with a bounded number in
+        flight, so memory stays flat regardless of history size.
+        """
+        workers = min(self.jobs, -(-total_commits // COMMIT_CHUNK_SIZE))
+        if workers <= 1:
+            _init_worker(str(self.repo_path))
+            yield from map(_extract_commits, chunks)
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(str(self.repo_path),)) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_extract_commits, chunk))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
     def _batch_commit_data(self, commit_batch, file_batch, metrics_accumulator):
-        """Commit batched data to database"""
+        """Write batched data to database (within the open transaction)"""
         if commit_batch:
             self.cursor.executemany(
                 "INSERT OR IGNORE INTO commits (sha, author_id, date, message) VALUES (?, ?, ?, ?)",
@@ -230,71 +453,119 @@ class RepoVis:
         
         if metrics_accumulator:
             self._batch_insert_metrics(metrics_accumulator)
+    
+    def _compute_ancestors(self, path: str) -> tuple:
+        """Return the ancestor directory paths of path, nearest first.
         
-        self.conn.commit()
+        Memoized per directory, so each directory is only split once per run.
+        """
+        chain = []
+        lineage = ()
+        parent = path.rstrip('/').rpartition('/')[0]
+        while parent:
+            dir_path = parent + '/'
+            cached = self.ancestors_cache.get(dir_path)
+            if cached is not None:
+                lineage = cached
+                break
+            chain.append(dir_path)
+            parent = parent.rpartition('/')[0]
+        
+        # Fill the cache for uncached directories from the top down
+        for dir_path in reversed(chain):
+            lineage = (dir_path,) + lineage
+            self.ancestors_cache[dir_path] = lineage
+        return lineage
     
     def _batch_insert_files(self, file_paths):
-        """Batch insert files with their parent directories"""
-        all_paths = set()
+        """Batch insert files with their parent directories, one statement per depth level"""
+        by_depth = defaultdict(list)
+        seen = set()
         for path in file_paths:
-            all_paths.add(path)
-            # Add all parent directories
-            parts = path.rstrip('/').split('/')
-            for i in range(1, len(parts)):
-                parent = '/'.join(parts[:i]) + '/'
-                all_paths.add(parent)
-        
-        # Sort by depth (parents first)
-        sorted_paths = sorted(all_paths, key=lambda p: p.count('/'))
-        
-        for path in sorted_paths:
-            if path not in self.file_cache:
-                is_directory = path.endswith('/')
-                clean_path = path.rstrip('/')
-                
-                parent_id = None
-                if '/' in clean_path:
-                    parent_path = '/'.join(clean_path.split('/')[:-1]) + '/'
-                    parent_id = self.file_cache.get(parent_path)
-                
-                name = clean_path.split('/')[-1] if '/' in clean_path else clean_path
-                
-                self.cursor.execute(
-                    "INSERT OR IGNORE INTO files (path, parent_id, name, is_directory) VALUES (?, ?, ?, ?)",
-                    (path, parent_id, name, is_directory)
-                )
-                self.cursor.execute("SELECT id FROM files WHERE path = ?", (path,))
-                result = self.cursor.fetchone()
-                if result:
-                    self.file_cache[path] = result[0]
+            ancestors = self._compute_ancestors(path)
+            for depth, entry in enumerate(reversed((path,) + ancestors)):
+                if entry not in seen and entry not in self.file_cache:
+                    seen.add(entry)
+                    by_depth[depth].append(entry)
+        
+        # Parents first, so every parent_id is cached before its children insert
+        for depth in sorted(by_depth):
+            paths = by_depth[depth]
+            rows = []
+            for path in paths:
+                parent_path, _, name = path.rstrip('/').rpartition('/')
+                parent_id = self.file_cache[parent_path + '/'] if parent_path else None
+                rows.append((path, parent_id, name, path.endswith('/')))
+            
+            self.cursor.executemany(
+                "INSERT OR IGNORE INTO files (path, parent_id, name, is_directory) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            
+            for i in range(0, len(paths), SQL_IN_CHUNK):
+                chunk = paths[i:i + SQL_IN_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                self.cursor.execute(f"SELECT path, id FROM files WHERE path IN ({placeholders})", chunk)
+                self.file_cache.update(self.cursor.fetchall())
     
     def _batch_insert_metrics(self, metrics_accumulator):
-        """Batch insert/update metrics"""
+        """Batch insert metrics into the staging table"""
         metrics_batch = []
-        for (file_path, contributor_id, date_str), count in metrics_accumulator.items():
+        for (file_path, contributor_id, date_str), (count, added, deleted) in metrics_accumulator.items():
             file_id = self.file_cache.get(file_path)
             if file_id:
-                metrics_batch.append((file_id, contributor_id, date_str, count, count))
+                metrics_batch.append((file_id, contributor_id, date_str, count, added, deleted))
         
         if metrics_batch:
-            self.cursor.executemany("""
-                INSERT INTO file_metrics (file_id, contributor_id, date, commit_count, lines_added, lines_deleted)
-                VALUES (?, ?, ?, ?, 0, 0)
-                ON CONFLICT(file_id, contributor_id, date) 
-                DO UPDATE SET commit_count = commit_count + ?
-            """, metrics_batch)
+            self.cursor.executemany(
+                "INSERT INTO file_metrics_stage VALUES (?, ?, ?, ?, ?, ?)",
+                metrics_batch
+            )
+    
+    def _merge_staged_metrics(self):
+        """Aggregate staged metric rows into file_metrics with a single statement.
+        
+        file_metrics is empty until now and GROUP BY yields one row per key,
+        so no conflict handling is needed.
+        """
+        self.cursor.execute("""
+            INSERT INTO file_metrics (file_id, contributor_id, date, commit_count, lines_added, lines_deleted)
+            SELECT file_id, contributor_id, date, SUM(commit_count), SUM(lines_added), SUM(lines_deleted)
+            FROM file_metrics_stage
+            GROUP BY file_id, contributor_id, date
+        """)
+        self.cursor.execute("DROP TABLE file_metrics_stage")
+    
+    def build_daily_totals(self):
+        """Materialize per-file daily totals across all contributors and the commit histogram"""
+        print("Building daily totals...")
+        self.cursor.execute("""
+            INSERT INTO file_metrics_daily_totals (date, file_id, commit_count, lines_added, lines_deleted)
+            SELECT date, file_id, SUM(commit_count), SUM(lines_added), SUM(lines_deleted)
+            FROM file_metrics
+            GROUP BY date, file_id
+        """)
+        self.cursor.execute("""
+            INSERT INTO commits_by_date (date, count)
+            SELECT date, COUNT(*) FROM commits GROUP BY date
+        """)
     
     def save_metadata(self):
         """Save repository metadata"""
         print("Saving metadata...")
         
+        # Counts the commits actually loaded (non-merge, within --since/--until)
+        self.cursor.execute("SELECT COUNT(*) FROM commits")
+        total_commits = self.cursor.fetchone()[0]
+        
         metadata = {
             'repo_path': str(self.repo_path),
             'processed_at': datetime.now().isoformat(),
             'head_sha': self.repo.head.commit.hexsha,
-            'total_commits': len(list(self.repo.iter_commits('--all'))),
+            'total_commits': total_commits,
             'total_contributors': len(self.contributor_cache),
-            'total_files': len(self.file_cache)
+            'total_files': len(self.file_cache),
+            'schema_version': SCHEMA_VERSION
         }
         
         # Add date range if specified
@@ -308,36 +579,30 @@ class RepoVis:
                 "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
                 (key, str(value))
             )
-        
-        self.conn.commit()
     
     def add_current_files(self):
         """Add current files and remove deleted files"""
         print("Syncing with current working tree...")
         
-        # Collect all current files
-        current_files = set()
-        
-        def walk_tree(tree, path=""):
-            """Recursively walk git tree and collect current files"""
-            for item in tree:
-                item_path = f"{path}{item.name}"
-                
-                if item.type == 'tree':
-                    # It's a directory
-                    dir_path = item_path + '/'
-                    current_files.add(dir_path)
-                    self.get_or_create_file(dir_path)
-                    # Recurse into subdirectory
-                    walk_tree(item, item_path + '/')
-                else:
-                    # It's a file (blob)
-                    current_files.add(item_path)
-                    self.get_or_create_file(item_path)
-        
         try:
-            head_tree = self.repo.head.commit.tree
-            walk_tree(head_tree)
+            # One ls-tree call lists every blob and (with -t) every tree at HEAD
+            output = subprocess.run(
+                ['git', 'ls-tree', '-r', '-t', '-z', 'HEAD'],
+                cwd=self.repo_path, capture_output=True, check=True
+            ).stdout
+            
+            current_files = set()
+            for entry in output.split(b'\x00'):
+                if not entry:
+                    continue
+                # Entry format: "<mode> <type> <object>\t<path>"
+                info, _, path = entry.partition(b'\t')
+                path = path.decode('utf-8', errors='replace')
+                if info.split(b' ')[1] == b'tree':
+                    path += '/'
+                current_files.add(path)
+            
+            self._batch_insert_files([path for path in current_files if path not in self.file_cache])
             
             # Find and delete files that no longer exist
             all_cached = set(self.file_cache.keys())
@@ -345,15 +610,20 @@ class RepoVis:
             
             if deleted_files:
                 print(f"  Removing {len(deleted_files)} deleted files from database...")
+                # Delete files and their metrics with two set-based statements
+                self.cursor.execute("CREATE TEMP TABLE current_paths (path TEXT PRIMARY KEY)")
+                self.cursor.executemany("INSERT INTO current_paths VALUES (?)", ((path,) for path in current_files))
+                self.cursor.execute("""
+                    DELETE FROM file_metrics WHERE file_id IN (
+                        SELECT id FROM files WHERE path NOT IN (SELECT path FROM current_paths)
+                    )
+                """)
+                self.cursor.execute("DELETE FROM files WHERE path NOT IN (SELECT path FROM current_paths)")
+                self.cursor.execute("DROP TABLE current_paths")
+                
                 for file_path in deleted_files:
-                    file_id = self.file_cache.get(file_path)
-                    if file_id:
-                        # Delete file and its metrics
-                        self.cursor.execute("DELETE FROM file_metrics WHERE file_id = ?", (file_id,))
-                        self.cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
-                        del self.file_cache[file_path]
+                    del self.file_cache[file_path]
             
-            self.conn.commit()
             print(f"  Total current files/directories: {len(self.file_cache)}")
         except Exception as e:
             print(f"Warning: Could not sync current files: {e}")
@@ -364,9 +634,21 @@ class RepoVis:
             self.open_repo()
             self.db_path = self.get_cache_db_path()
             self.initialize_db()
+            
+            # The whole load runs in one transaction, apart from periodic
+            # commits in process_commits on very large histories
+            self.cursor.execute("BEGIN")
             self.process_commits()
             self.add_current_files()
+            self.build_daily_totals()
             self.save_metadata()
+            self.conn.commit()
+            
+            self.finalize_indexes()
+            
+            # Fold the WAL back into the main file: the server opens it with
+            # immutable=1, which never reads a WAL or its shared-memory index
+            self.cursor.executescript("PRAGMA journal_mode=DELETE;")
             
             print(f"\n✓ Successfully preprocessed repository")
             print(f"  Database: {self.db_path}")
@@ -377,7 +659,46 @@ class RepoVis:
             if self.conn:
                 self.conn.close()
     
-    def serve(self, host: str = "127.0.0.1", port: int = 8000):
+    def is_cache_current(self, db_path: Path) -> bool:
+        """Check whether a cached database was built with the current schema"""
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                row = conn.execute("SELECT value FROM metadata WHERE key = 'schema_version'").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return False
+        return row is not None and row[0] == str(SCHEMA_VERSION)
+    
+    def ensure_indexes(self):
+        """Create any secondary indexes missing from an existing cache database"""
+        with open(Path(__file__).parent / "schema_indexes.sql") as f:
+            index_sql = f.read()
+        expected = set(re.findall(r"CREATE INDEX IF NOT EXISTS (\w+)", index_sql))
+        
+        # Check over a read-only connection so a read-only cache can still be served
+        conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            existing = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        finally:
+            conn.close()
+        if expected <= existing:
+            return
+        
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.executescript(index_sql)
+                conn.execute("ANALYZE")
+                conn.commit()
+            finally:
+                conn.close()
+            print("Added missing indexes to cached database")
+        except sqlite3.OperationalError as e:
+            print(f"Warning: Could not add missing indexes ({e}); queries may be slower")
+    
+    def serve(self, host: str = "127.0.0.1", port: int = 8000, cors_origins: list = None):
         """Start web server"""
         self.db_path = self.get_cache_db_path()
         
@@ -386,24 +707,122 @@ class RepoVis:
             print("Run with --rebuild to preprocess the repository first.")
             sys.exit(1)
         
+        # Readers below open the file read-only, so migrate before serving
+        self.ensure_indexes()
+        
+        # Responses are a function of the database file and the query, so
+        # the file's identity at startup seeds every ETag
+        db_stat = self.db_path.stat()
+        db_version = f"{db_stat.st_mtime_ns}:{db_stat.st_size}"
+        
+        # A small pool of long-lived read-only connections, opened once at
+        # startup. The database is never written while serving, so
+        # immutable=1 lets SQLite skip locking and change detection entirely.
+        db_uri = f"{self.db_path.resolve().as_uri()}?mode=ro&immutable=1"
+        pool_size = min(os.cpu_count() or 1, 8)
+        
+        def open_connection():
+            conn = sqlite3.connect(db_uri, uri=True, check_same_thread=False, cached_statements=256)
+            # The server never writes, so query_only is a free safety net
+            conn.execute("PRAGMA query_only=ON")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-65536")
+            try:
+                conn.execute("PRAGMA mmap_size=1073741824")
+            except sqlite3.Error:
+                pass  # Memory-mapped I/O is unavailable on some platforms
+            return conn
+        
+        def join_file_columns(arrays):
+            """Join per-column JSON arrays into the '"id":[...],"path":[...],...' fragment"""
+            return ",".join(f'"{column}":{array}' for column, array in zip(FILE_COLUMNS, arrays)).encode()
+        
+        def tree_body(columns, values, metric):
+            """/api/tree body as byte parts; cache entries share the large structure columns"""
+            tail = (f',"value":{values}}},"date_range":{app.state.date_range},'
+                    f'"metric_type":{json.dumps(metric)}}}').encode()
+            return (b'{"files":{', columns, tail)
+        
+        @asynccontextmanager
+        async def lifespan(app):
+            connections = [open_connection() for _ in range(pool_size)]
+            
+            # The file tree and commit date range are the same for every
+            # /api/tree response, so serialize them once
+            arrays = ", ".join(f"json_group_array({column})" for column in FILE_COLUMNS)
+            row = connections[0].execute(f"""
+                SELECT {arrays}, json_group_array(NULL)
+                FROM (SELECT {', '.join(FILE_COLUMNS)} FROM files ORDER BY path)
+            """).fetchone()
+            app.state.file_columns = join_file_columns(row[:-1])
+            app.state.empty_values = row[-1]
+            app.state.date_range = connections[0].execute(
+                "SELECT json_object('min_date', MIN(date), 'max_date', MAX(date)) FROM commits"
+            ).fetchone()[0]
+            
+            app.state.pool = queue.SimpleQueue()
+            for conn in connections:
+                app.state.pool.put(conn)
+            yield
+            for conn in connections:
+                conn.close()
+        
         # Setup FastAPI app
-        app = FastAPI(title="repovis API", version="0.1.0")
-        
-        app.add_middleware(
-            CORSMiddleware,
-            allow_origins=["*"],
-            allow_credentials=True,
-            allow_methods=["*"],
-            allow_headers=["*"],
-        )
+        app = FastAPI(title="repovis API", version="0.1.0", lifespan=lifespan,
+                      default_response_class=ORJSONResponse)
+        
+        # The bundled frontend is same-origin; other origins must be listed explicitly
+        if cors_origins:
+            app.add_middleware(
+                CORSMiddleware,
+                allow_origins=cors_origins,
+                allow_credentials=False,
+                allow_methods=["GET"],
+                allow_headers=["If-None-Match"],
+                expose_headers=["ETag"],
+                max_age=86400,
+            )
+        app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
         
-        db_path = str(self.db_path)
         web_dir = Path(__file__).parent / "web"
         
-        def get_db():
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+        # Endpoints borrow inside their own body, never through a threadpool
+        # dependency: a dependency blocked on an empty pool would hold a
+        # worker thread that the connection's current holder needs to finish
+        @contextmanager
+        def pooled_connection():
+            """Borrow a connection from the pool, blocking until one is free"""
+            conn = app.state.pool.get()
+            try:
+                yield conn
+            finally:
+                app.state.pool.put(conn)
+        
+        def make_etag(*parts):
+            """Weak validator for a response derived from the database and the given parameters.
+            
+            Weak because GZipMiddleware may send the same representation gzip-encoded.
+            """
+            digest = hashlib.blake2b(repr((db_version,) + parts).encode(), digest_size=16).hexdigest()
+            return f'W/"{digest}"'
+        
+        def validator_headers(etag):
+            # no-cache makes browsers revalidate every time, answered by a 304
+            return {"ETag": etag, "Cache-Control": "no-cache"}
+        
+        def parse_ids(value: str) -> tuple:
+            """Parse a comma-separated id list into a hashable tuple of ints"""
+            try:
+                return tuple(map(int, filter(str.strip, value.split(','))))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid contributor id list: {value!r}")
+        
+        def is_not_modified(request: Request, etag: str) -> bool:
+            # If-None-Match uses weak comparison: the W/ prefix is ignored on both sides
+            def opaque(tag):
+                return tag[2:] if tag.startswith("W/") else tag
+            tags = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+            return any(tag == "*" or opaque(tag) == opaque(etag) for tag in tags)
         
         @app.get("/")
         async def root():
@@ -413,114 +832,108 @@ class RepoVis:
             return {"message": "repovis API", "docs": "/docs"}
         
         @app.get("/api/metadata")
-        async def get_metadata():
-            conn = get_db()
-            cursor = conn.cursor()
-            cursor.execute("SELECT key, value FROM metadata")
-            metadata = {row['key']: row['value'] for row in cursor.fetchall()}
-            conn.close()
-            return metadata
+        def get_metadata():
+            with pooled_connection() as db:
+                cursor = db.cursor()
+                cursor.execute("SELECT json_group_object(key, value) FROM metadata")
+                content = cursor.fetchone()[0]
+            return Response(content=content, media_type="application/json")
         
-        @app.get("/api/tree")
-        async def get_tree(
-            start_date: str = Query(None),
-            end_date: str = Query(None),
-            contributors: str = Query(None),
-            exclude_contributors: str = Query(None),
-            metric: str = Query("commit_count")
-        ):
-            conn = get_db()
-            cursor = conn.cursor()
+        @lru_cache(maxsize=TREE_CACHE_SIZE)
+        def tree_payload(start_date, end_date, contributor_ids, excluded_ids, metric, only_active):
+            """Serialized /api/tree response body parts, built as JSON by SQLite.
             
-            cursor.execute("SELECT id, path, parent_id, name, is_directory FROM files ORDER BY path")
+            Files are returned as columns (one array per field). The structure
+            columns and date range are loaded once at startup, so a request
+            only aggregates the requested metric into the value column, and a
+            cache entry holds little more than that column. The pooled
+            connections keep reading the file they opened at startup (a
+            rebuild unlinks and recreates it), so the payload is cached per
+            distinct set of query parameters for the server's lifetime.
+            """
+            if not (start_date and end_date):
+                # Structure only
+                return tree_body(app.state.file_columns, app.state.empty_values, metric)
             
-            files = []
-            for row in cursor.fetchall():
-                files.append({
-                    'id': row['id'],
-                    'path': row['path'],
-                    'parent_id': row['parent_id'],
-                    'name': row['name'],
-                    'is_directory': bool(row['is_directory'])
-                })
+            # Only the requested metric is aggregated; the name is whitelisted
+            column = metric if metric in ('lines_added', 'lines_deleted') else 'commit_count'
             
-            metrics_map = {}
-            if start_date and end_date:
-                query = """
-                    SELECT file_id,
-                           SUM(commit_count) as total_commits,
-                           SUM(lines_added) as total_lines_added,
-                           SUM(lines_deleted) as total_lines_deleted
-                    FROM file_metrics
-                    WHERE date >= ? AND date <= ?
-                """
-                params = [start_date, end_date]
-                
-                if contributors:
-                    contributor_ids = [int(c.strip()) for c in contributors.split(',') if c.strip()]
-                    if contributor_ids:
-                        placeholders = ','.join('?' * len(contributor_ids))
-                        query += f" AND contributor_id IN ({placeholders})"
-                        params.extend(contributor_ids)
-                elif exclude_contributors:
-                    excluded_ids = [int(c.strip()) for c in exclude_contributors.split(',') if c.strip()]
-                    if excluded_ids:
-                        placeholders = ','.join('?' * len(excluded_ids))
-                        query += f" AND contributor_id NOT IN ({placeholders})"
-                        params.extend(excluded_ids)
-                
-                query += " GROUP BY file_id"
-                cursor.execute(query, params)
-                
-                for row in cursor.fetchall():
-                    if metric == "commit_count":
-                        value = row['total_commits']
-                    elif metric == "lines_added":
-                        value = row['total_lines_added']
-                    elif metric == "lines_deleted":
-                        value = row['total_lines_deleted']
-                    else:
-                        value = row['total_commits']
-                    
-                    metrics_map[row['file_id']] = {
-                        'commit_count': row['total_commits'],
-                        'lines_added': row['total_lines_added'],
-                        'lines_deleted': row['total_lines_deleted'],
-                        'value': value
-                    }
+            # Without a contributor filter, read the much smaller pre-summed table
+            table = "file_metrics" if contributor_ids or excluded_ids else "file_metrics_daily_totals"
+            metrics_query = f"""
+                SELECT file_id, SUM({column}) AS value
+                FROM {table}
+                WHERE date >= ? AND date <= ?
+            """
+            params = [start_date, end_date]
             
-            for file_data in files:
-                file_data['metrics'] = metrics_map.get(file_data['id'])
+            # Id lists are bound as one JSON array, so every list length
+            # shares a single cached statement
+            if contributor_ids:
+                metrics_query += " AND contributor_id IN (SELECT value FROM json_each(?))"
+                params.append(json.dumps(list(contributor_ids)))
+            elif excluded_ids:
+                metrics_query += " AND contributor_id NOT IN (SELECT value FROM json_each(?))"
+                params.append(json.dumps(list(excluded_ids)))
             
-            cursor.execute("SELECT MIN(date) as min_date, MAX(date) as max_date FROM commits")
-            date_row = cursor.fetchone()
-            conn.close()
+            metrics_query += " GROUP BY file_id"
+            
+            # only_active drops files without activity in the range, which
+            # changes the structure columns as well
+            join = "JOIN" if only_active else "LEFT JOIN"
+            rows_query = f"""
+                SELECT f.id, f.path, f.parent_id, f.name, f.is_directory, m.value
+                FROM files f
+                {join} ({metrics_query}) m ON m.file_id = f.id
+                ORDER BY f.path
+            """
             
-            return {
-                'files': files,
-                'date_range': {
-                    'min_date': date_row['min_date'],
-                    'max_date': date_row['max_date']
-                },
-                'metric_type': metric
-            }
+            arrays = [f"json_group_array({column})" for column in FILE_COLUMNS] if only_active else []
+            arrays.append("json_group_array(value)")
+            
+            # json_group_array keeps the ORDER BY of the inner query
+            with pooled_connection() as conn:
+                row = conn.execute(f"SELECT {', '.join(arrays)} FROM ({rows_query})", params).fetchone()
+            columns = join_file_columns(row[:-1]) if only_active else app.state.file_columns
+            return tree_body(columns, row[-1], metric)
+        
+        @app.get("/api/tree")
+        def get_tree(
+            request: Request,
+            start_date: str = Query(None),
+            end_date: str = Query(None),
+            contributors: str = Query(None),
+            exclude_contributors: str = Query(None),
+            metric: str = Query("commit_count"),
+            only_active: bool = Query(False)
+        ):
+            # An include list takes precedence over an exclude list
+            contributor_ids = parse_ids(contributors) if contributors else ()
+            excluded_ids = parse_ids(exclude_contributors) if exclude_contributors and not contributors else ()
+            etag = make_etag("tree", start_date, end_date, contributor_ids, excluded_ids, metric, only_active)
+            headers = validator_headers(etag)
+            if is_not_modified(request, etag):
+                return Response(status_code=304, headers=headers)
+            # Cache entries share the structure columns; only the response joins them
+            content = b"".join(tree_payload(start_date, end_date, contributor_ids, excluded_ids, metric, only_active))
+            return Response(content=content, media_type="application/json", headers=headers)
         
         @app.get("/api/contributors")
-        async def get_contributors():
-            conn = get_db()
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, name, email FROM contributors ORDER BY name")
-            contributors = [{'id': row['id'], 'name': row['name'], 'email': row['email']} 
-                          for row in cursor.fetchall()]
-            conn.close()
-            return {'contributors': contributors}
+        def get_contributors(request: Request):
+            etag = make_etag("contributors")
+            headers = validator_headers(etag)
+            if is_not_modified(request, etag):
+                return Response(status_code=304, headers=headers)
+            with pooled_connection() as db:
+                cursor = db.cursor()
+                cursor.execute("SELECT id, name, email FROM contributors ORDER BY name")
+                contributors = [{'id': id_, 'name': name, 'email': email}
+                                for id_, name, email in cursor.fetchall()]
+            return ORJSONResponse({'contributors': contributors}, headers=headers)
         
         @app.get("/api/timeline")
-        async def get_timeline(start_date: str = None, end_date: str = None):
-            conn = get_db()
-            cursor = conn.cursor()
-            
-            query = "SELECT date, COUNT(*) as count FROM commits"
+        def get_timeline(start_date: str = None, end_date: str = None):
+            query = "SELECT date, count FROM commits_by_date"
             params = []
             conditions = []
             
@@ -533,58 +946,67 @@ class RepoVis:
             
             if conditions:
                 query += " WHERE " + " AND ".join(conditions)
-            query += " GROUP BY date ORDER BY date"
+            query += " ORDER BY date"
             
-            cursor.execute(query, params)
-            timeline = [{'date': row['date'], 'count': row['count']} for row in cursor.fetchall()]
-            conn.close()
+            with pooled_connection() as db:
+                cursor = db.cursor()
+                cursor.execute(query, params)
+                timeline = [{'date': date, 'count': count} for date, count in cursor.fetchall()]
             return {'timeline': timeline}
         
         @app.get("/api/file/{file_id}")
-        async def get_file_details(file_id: int):
-            conn = get_db()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT id, path, parent_id, name, is_directory FROM files WHERE id = ?", (file_id,))
-            row = cursor.fetchone()
-            if not row:
-                conn.close()
-                raise HTTPException(status_code=404, detail="File not found")
-            
-            file_info = {
-                'id': row['id'],
-                'path': row['path'],
-                'parent_id': row['parent_id'],
-                'name': row['name'],
-                'is_directory': bool(row['is_directory'])
-            }
-            
-            cursor.execute("""
-                SELECT c.id, c.name, c.email, SUM(fm.commit_count) as total_commits
-                FROM file_metrics fm
-                JOIN contributors c ON fm.contributor_id = c.id
-                WHERE fm.file_id = ?
-                GROUP BY c.id
-                ORDER BY total_commits DESC
-                LIMIT 10
-            """, (file_id,))
-            
-            file_info['top_contributors'] = [
-                {'id': row['id'], 'name': row['name'], 'email': row['email'], 'commits': row['total_commits']}
-                for row in cursor.fetchall()
-            ]
+        def get_file_details(file_id: int):
+            with pooled_connection() as db:
+                cursor = db.cursor()
+                
+                cursor.execute("SELECT id, path, parent_id, name, is_directory FROM files WHERE id = ?", (file_id,))
+                row = cursor.fetchone()
+                if not row:
+                    raise HTTPException(status_code=404, detail="File not found")
+                
+                id_, path, parent_id, name, is_directory = row
+                file_info = {
+                    'id': id_,
+                    'path': path,
+                    'parent_id': parent_id,
+                    'name': name,
+                    'is_directory': bool(is_directory)
+                }
+                
+                # Rank from the covering index first, then look up only the top 10 contributors
+                cursor.execute("""
+                    WITH top AS (
+                        SELECT contributor_id, SUM(commit_count) as total_commits
+                        FROM file_metrics
+                        WHERE file_id = ?
+                        GROUP BY contributor_id
+                        ORDER BY total_commits DESC
+                        LIMIT 10
+                    )
+                    SELECT c.id, c.name, c.email, top.total_commits
+                    FROM top
+                    JOIN contributors c ON c.id = top.contributor_id
+                    ORDER BY top.total_commits DESC
+                """, (file_id,))
+                
+                file_info['top_contributors'] = [
+                    {'id': id_, 'name': name, 'email': email, 'commits': total_commits}
+                    for id_, name, email, total_commits in cursor.fetchall()
+                ]
             
-            conn.close()
             return file_info
         
         # Mount static files
         if web_dir.exists():
             css_dir = web_dir / "css"
             js_dir = web_dir / "js"
+            # Compressed once here rather than by GZipMiddleware on every request
             if css_dir.exists():
-                app.mount("/css", StaticFiles(directory=str(css_dir)), name="css")
+                precompress_static(css_dir)
+                app.mount("/css", PrecompressedStaticFiles(directory=str(css_dir)), name="css")
             if js_dir.exists():
-                app.mount("/js", StaticFiles(directory=str(js_dir)), name="js")
+                precompress_static(js_dir)
+                app.mount("/js", PrecompressedStaticFiles(directory=str(js_dir)), name="js")
         
         print(f"Starting repovis server...")
         print(f"  Repository: {self.repo_path}")
@@ -592,7 +1014,13 @@ class RepoVis:
         print(f"  URL: http://{host}:{port}")
         print(f"  API docs: http://{host}:{port}/docs")
         
-        uvicorn.run(app, host=host, port=port)
+        # Per-request access logging costs more than most of our queries. The
+        # app is built in this process around its connection pool, so it
+        # runs as a single uvicorn worker; concurrency comes from the threadpool.
+        # uvloop has no Windows build, so fall back to asyncio's loop there.
+        loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+        uvicorn.run(app, host=host, port=port, loop=loop, http="httptools",
+                    log_level="warning", access_log=False)
 
 
 def main():
@@ -635,23 +1063,40 @@ def main():
         '--until',
         help='Only process commits until this date (e.g., "2024-12-31", "yesterday")'
     )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=None,
+        help='Number of worker processes for commit extraction (default: CPU count)'
+    )
+    parser.add_argument(
+        '--cors-origin',
+        action='append',
+        dest='cors_origins',
+        metavar='ORIGIN',
+        help='Allow cross-origin API requests from ORIGIN (repeatable; default: same-origin only)'
+    )
     
     args = parser.parse_args()
     
-    repovis = RepoVis(args.repo_path, since=args.since, until=args.until)
+    repovis = RepoVis(args.repo_path, since=args.since, until=args.until, jobs=args.jobs)
     
     # Check if DB exists
     db_path = repovis.get_cache_db_path()
-    needs_rebuild = args.rebuild or not db_path.exists()
-    
-    if needs_rebuild:
-        print(f"{'Rebuilding' if args.rebuild else 'Building'} database...")
+    if args.rebuild:
+        print("Rebuilding database...")
+        repovis.preprocess()
+    elif not db_path.exists():
+        print("Building database...")
+        repovis.preprocess()
+    elif not repovis.is_cache_current(db_path):
+        print("Cached database was built by an older version, rebuilding...")
         repovis.preprocess()
     else:
         print(f"Using cached database: {db_path}")
     
     if not args.preprocess_only:
-        repovis.serve(host=args.host, port=args.port)
+        repovis.serve(host=args.host, port=args.port, cors_origins=args.cors_origins)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,19 @@
+-- SQLite schema for repovis preprocessed data: secondary indexes
+-- Built once by finalize_indexes() after preprocessing has loaded all rows
+
+CREATE INDEX IF NOT EXISTS idx_files_parent ON files(parent_id);
+CREATE INDEX IF NOT EXISTS idx_files_path ON files(path);
+
+CREATE INDEX IF NOT EXISTS idx_contributors_email ON contributors(email);
+
+-- Covering index for /api/file's top contributors: per-contributor sums for a
+-- file are read from the index alone. The UNIQUE(file_id, contributor_id, date)
+-- autoindex shares its prefix but lacks commit_count, so it would hit the table
+CREATE INDEX IF NOT EXISTS idx_metrics_file_contributor ON file_metrics(file_id, contributor_id, commit_count);
+-- Covering index for /api/tree's date-range aggregation: the query is answered
+-- from the index alone, without touching the table rows
+CREATE INDEX IF NOT EXISTS idx_metrics_date_contributor ON file_metrics(date, contributor_id, file_id, commit_count, lines_added, lines_deleted);
+CREATE INDEX IF NOT EXISTS idx_metrics_contributor ON file_metrics(contributor_id);
+
+CREATE INDEX IF NOT EXISTS idx_commits_date ON commits(date);
+CREATE INDEX IF NOT EXISTS idx_commits_author ON commits(author_id);
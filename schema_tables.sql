@@ -1,4 +1,5 @@
--- SQLite schema for repovis preprocessed data
+-- SQLite schema for repovis preprocessed data: tables
+-- Secondary indexes live in schema_indexes.sql and are built after the bulk load
 
 -- File tree structure
 CREATE TABLE IF NOT EXISTS files (
@@ -10,9 +11,6 @@ CREATE TABLE IF NOT EXISTS files (
     FOREIGN KEY (parent_id) REFERENCES files(id)
 );
 
-CREATE INDEX IF NOT EXISTS idx_files_parent ON files(parent_id);
-CREATE INDEX IF NOT EXISTS idx_files_path ON files(path);
-
 -- Contributors
 CREATE TABLE IF NOT EXISTS contributors (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -20,8 +18,6 @@ CREATE TABLE IF NOT EXISTS contributors (
     email TEXT NOT NULL UNIQUE
 );
 
-CREATE INDEX IF NOT EXISTS idx_contributors_email ON contributors(email);
-
 -- Time-bucketed metrics for files/directories
 -- Each row represents activity for a file in a specific time bucket
 CREATE TABLE IF NOT EXISTS file_metrics (
@@ -37,10 +33,16 @@ CREATE TABLE IF NOT EXISTS file_metrics (
     UNIQUE(file_id, contributor_id, date)
 );
 
-CREATE INDEX IF NOT EXISTS idx_metrics_file ON file_metrics(file_id);
-CREATE INDEX IF NOT EXISTS idx_metrics_date ON file_metrics(date);
-CREATE INDEX IF NOT EXISTS idx_metrics_contributor ON file_metrics(contributor_id);
-CREATE INDEX IF NOT EXISTS idx_metrics_file_date ON file_metrics(file_id, date);
+-- Per-file daily totals across all contributors, derived from file_metrics
+-- after preprocessing. Serves tree queries that have no contributor filter.
+CREATE TABLE IF NOT EXISTS file_metrics_daily_totals (
+    date TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    commit_count INTEGER DEFAULT 0,
+    lines_added INTEGER DEFAULT 0,
+    lines_deleted INTEGER DEFAULT 0,
+    PRIMARY KEY (date, file_id)
+) WITHOUT ROWID;
 
 -- Commits table for timeline/histogram
 CREATE TABLE IF NOT EXISTS commits (
@@ -52,8 +54,12 @@ CREATE TABLE IF NOT EXISTS commits (
     FOREIGN KEY (author_id) REFERENCES contributors(id)
 );
 
-CREATE INDEX IF NOT EXISTS idx_commits_date ON commits(date);
-CREATE INDEX IF NOT EXISTS idx_commits_author ON commits(author_id);
+-- Commits per day, derived from commits after preprocessing. Serves the
+-- timeline histogram.
+CREATE TABLE IF NOT EXISTS commits_by_date (
+    date TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
 
 -- Metadata about the repository
 CREATE TABLE IF NOT EXISTS metadata (
@@ -1,5 +1,21 @@
 const API_BASE = '/api';
 
+// /api/tree sends files column-wise ({id: [...], path: [...], ...});
+// rebuild one object per file for code that works row-wise
+function filesFromColumns(columns) {
+    const fields = Object.keys(columns);
+    const count = fields.length ? columns[fields[0]].length : 0;
+    const files = new Array(count);
+    for (let i = 0; i < count; i++) {
+        const file = {};
+        for (const field of fields) {
+            file[field] = columns[field][i];
+        }
+        files[i] = file;
+    }
+    return files;
+}
+
 class TreemapVis {
     constructor() {
         this.treeData = null;
@@ -114,8 +130,8 @@ class TreemapVis {
             // Load file structure without date filter - gets all files
             const response = await fetch(`${API_BASE}/tree`);
             const data = await response.json();
-            this.fullTreeData = data.files;
-            this.treeData = data.files;
+            this.fullTreeData = filesFromColumns(data.files);
+            this.treeData = this.fullTreeData;
             console.log('File structure loaded:', this.fullTreeData.length, 'files');
             
             // Debug: log a few sample files
@@ -143,8 +159,9 @@ class TreemapVis {
         this.pendingMetricsRequest = requestParams;
         
         try {
-            // Load only metrics for the time range
-            let url = `${API_BASE}/tree?start_date=${startDate}&end_date=${endDate}`;
+            // Load only metrics for the time range; structure comes from loadFileStructure,
+            // so only files with activity are needed
+            let url = `${API_BASE}/tree?start_date=${startDate}&end_date=${endDate}&only_active=1`;
             
             console.log('loadMetrics called with:', {
                 contributorIds,
@@ -189,16 +206,18 @@ class TreemapVis {
             const response = await fetch(url);
             const data = await response.json();
             
+            const { path: paths, name: names, value: values } = data.files;
+            
             // Debug: Check how many files have metrics
-            const filesWithMetrics = data.files.filter(f => f.metrics && f.metrics.value > 0);
-            console.log(`API returned ${data.files.length} files, ${filesWithMetrics.length} have non-zero metrics`);
+            const filesWithMetrics = values.filter(v => v > 0);
+            console.log(`API returned ${paths.length} files, ${filesWithMetrics.length} have non-zero metrics`);
             
-            // Create a map of metrics by file path
+            // Create a map of metrics by file path (read straight from the columns)
             this.metricsData = {};
-            data.files.forEach(f => {
-                const key = f.path || f.name;
-                this.metricsData[key] = f.metrics;
-            });
+            for (let i = 0; i < paths.length; i++) {
+                const key = paths[i] || names[i];
+                this.metricsData[key] = values[i] === null ? null : { value: values[i] };
+            }
             
             console.log('Metrics loaded for', Object.keys(this.metricsData).length, 'files');
             
@@ -231,7 +250,7 @@ class TreemapVis {
             }
             const response = await fetch(url);
             const data = await response.json();
-            this.treeData = data.files; // API returns { files: [...] }
+            this.treeData = filesFromColumns(data.files); // API returns { files: {id: [...], ...} }
             this.dateRange = data.date_range;
             console.log('Data loaded:', this.treeData.length, 'files');
         } catch (error) {
@@ -632,6 +651,19 @@ class TreemapVis {
             }
         });
         
+        // Roll leaf values up to directories in one post-order pass
+        const directoryTotals = new Map();
+        this.root.eachAfter(node => {
+            if (!node.children) return;
+            let total = 0;
+            for (const child of node.children) {
+                total += child.children
+                    ? directoryTotals.get(child)
+                    : (child.data.metrics ? child.data.metrics.value : 0);
+            }
+            directoryTotals.set(node, total);
+        });
+        
         console.log(`Updating colors with percentile map`);
         
         // Color scale: yellow for 0 commits, percentile-based for commits
@@ -661,13 +693,8 @@ class TreemapVis {
                     // Files
                     return node.data.metrics ? getColor(node.data.metrics.value) : '#30363d';
                 } else {
-                    // Directories - calculate sum of children's metrics
-                    let totalCommits = 0;
-                    node.each(child => {
-                        if (!child.children && child.data.metrics) {
-                            totalCommits += child.data.metrics.value;
-                        }
-                    });
+                    // Directories - sum of all descendant files' metrics
+                    const totalCommits = directoryTotals.get(node) || 0;
                     
                     if (totalCommits > 0) {
                         const baseColor = d3.color(getColor(totalCommits));
@@ -715,7 +742,7 @@ class TreemapVis {
         try {
             const response = await fetch(`${API_BASE}/tree`);
             const data = await response.json();
-            this.explorerTreeData = data.files;
+            this.explorerTreeData = filesFromColumns(data.files);
             console.log('Tree explorer loaded:', this.explorerTreeData.length, 'files');
             this.renderTreeView();
         } catch (error) {